@@ -1,36 +1,46 @@
-from fastapi import APIRouter, HTTPException
-from typing import Dict, Any
-from ..services.serp_service import SerpService
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from typing import Dict, Any, Optional
+from ..services.serp_service import RateLimitExceeded, SerpService
 import logging
 import traceback
 import httpx
 
-# Set up logging with basic configuration for the module
-logging.basicConfig(level=logging.INFO)
+# Logging is configured centrally in main.py
 logger = logging.getLogger(__name__)
 
 # Create the API router instance
 router = APIRouter()
-# Instantiate the SerpService (note: methods like get_local_results and get_related_questions are not used here)
-serp_service = SerpService()
+
+def get_serp_service(request: Request) -> SerpService:
+    """
+    Dependency returning the shared SerpService created in the app lifespan,
+    which holds the pooled HTTP client.
+    """
+    return request.app.state.serp_service
 
 @router.get("/search")
-async def search(query: str) -> Dict[str, Any]:
+async def search(
+    query: str,
+    serp_service: SerpService = Depends(get_serp_service),
+    cache_control: Optional[str] = Header(None)
+) -> Dict[str, Any]:
     """
     Perform a comprehensive search using SerpAPI endpoints.
     
     This endpoint:
       - Logs the search request.
-      - Calls the main search method from SerpService.
+      - Calls the main search method from SerpService, bypassing its result
+        cache when the request sends `Cache-Control: no-cache`.
       - Handles various exceptions (HTTP errors, network issues, unexpected errors)
         and converts them into appropriate HTTPExceptions.
     """
-    logger.info(f"Search request received for query: {query}")
+    logger.info("Search request received for query: %s", query)
     
     try:
         # Retrieve all search results via the SerpService
-        results = await serp_service.search(query)
-        logger.info(f"Search successful for query: {query}")
+        use_cache = "no-cache" not in (cache_control or "").lower()
+        results = await serp_service.search(query, use_cache=use_cache)
+        logger.info("Search successful for query: %s", query)
         return results
     
     except httpx.HTTPStatusError as e:
@@ -38,7 +48,7 @@ async def search(query: str) -> Dict[str, Any]:
         status_code = e.response.status_code
         error_detail = f"SerpAPI HTTP Error: {status_code} - {str(e)}"
         logger.error(error_detail)
-        logger.error(f"Response content: {e.response.text}")
+        logger.error("Response content: %s", e.response.text)
         
         # Customize HTTP responses based on status code
         if status_code in [401, 403]:
@@ -57,6 +67,15 @@ async def search(query: str) -> Dict[str, Any]:
                 detail=f"External API error: {str(e)}"
             )
             
+    except RateLimitExceeded as e:
+        # Handle requests the local rate limiter refused to queue any longer
+        logger.warning("Search throttled for query: %s (%s)", query, e)
+        raise HTTPException(
+            status_code=503,
+            detail="Rate limit exceeded. Please try again later.",
+            headers={"Retry-After": str(int(e.retry_after) + 1)}
+        )
+
     except httpx.RequestError as e:
         # Handle network or connection errors
         error_detail = f"Network error when connecting to SerpAPI: {str(e)}"
@@ -70,7 +89,8 @@ async def search(query: str) -> Dict[str, Any]:
         # Handle any other unexpected errors
         error_detail = f"Search failed: {str(e)}"
         logger.error(error_detail)
-        logger.error(traceback.format_exc())
+        if logger.isEnabledFor(logging.ERROR):
+            logger.error(traceback.format_exc())
         raise HTTPException(
             status_code=500, 
             detail=error_detail
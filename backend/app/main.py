@@ -1,26 +1,103 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
 import os
+import logging.config
+import httpx
 from .api import search
+from .services.serp_service import SerpService
 
 load_dotenv()
 
-CORS_ORIGINS = os.getenv("CORS_ORIGINS", "").split(",")
+# Configure logging once for the whole app
+logging.config.dictConfig({
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "default": {"format": "%(levelname)s:%(name)s:%(message)s"}
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "default"}
+    },
+    "root": {"level": os.getenv("LOG_LEVEL", "INFO").upper(), "handlers": ["console"]}
+})
+
+# Ignore empty entries so an unset CORS_ORIGINS yields no origins rather than [""]
+CORS_ORIGINS = [o.strip() for o in os.getenv("CORS_ORIGINS", "").split(",") if o.strip()]
+
+HTTP_TRANSPORT = os.getenv("HTTP_TRANSPORT", "httpx").lower()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create a single pooled HTTP client for the lifetime of the app so outbound
+    SerpAPI requests reuse warm keep-alive connections instead of opening a new
+    TCP+TLS connection per call.
+
+    By default httpx's own transport is used with HTTP/2, letting the parallel
+    SerpAPI calls made per search multiplex over one connection. Setting
+    HTTP_TRANSPORT=aiohttp keeps the httpx API but routes requests through an
+    aiohttp connection pool, which holds up better under high concurrency
+    (aiohttp only speaks HTTP/1.1).
+    """
+    aiohttp_session = None
+    if HTTP_TRANSPORT == "aiohttp":
+        import aiohttp
+        from httpx_aiohttp import AiohttpTransport
+
+        aiohttp_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=128,
+                limit_per_host=64,
+                keepalive_timeout=30
+            )
+        )
+        app.state.http_client = httpx.AsyncClient(
+            timeout=30.0,
+            transport=AiohttpTransport(client=aiohttp_session)
+        )
+    else:
+        app.state.http_client = httpx.AsyncClient(
+            timeout=30.0,
+            http2=True,
+            limits=httpx.Limits(
+                max_keepalive_connections=32,
+                max_connections=128,
+                keepalive_expiry=30
+            )
+        )
+    app.state.serp_service = SerpService(client=app.state.http_client)
+    try:
+        yield
+    finally:
+        # Close the httpx wrapper first, then the aiohttp session underneath it
+        await app.state.http_client.aclose()
+        if aiohttp_session is not None:
+            await aiohttp_session.close()
 
 app = FastAPI(
     title="Google Search Clone API",
     description="Backend API for Google Search Clone using SerpAPI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=CORS_ORIGINS,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Only install CORS handling when there are origins to allow
+if CORS_ORIGINS:
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+# Compress larger payloads (full search results easily exceed tens of KB)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 app.include_router(search.router, prefix="/api/v1", tags=["search"])
 
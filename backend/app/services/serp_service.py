@@ -1,12 +1,15 @@
 import os
 import re
+import time
 import asyncio
 import logging
-from typing import Dict, Any, List, Optional
-from urllib.parse import urlparse, parse_qs
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import unquote_plus
 
 import httpx
-import backoff
+import orjson
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -14,40 +17,227 @@ load_dotenv()
 # Configure logger for the module
 logger = logging.getLogger(__name__)
 
+# In-process cache settings for search results (seconds / number of queries)
+CACHE_TTL = 600.0
+CACHE_MAXSIZE = 2048
+
+# Requests per second allowed by the SerpAPI plan, enforced before sending
+SERPAPI_MAX_QPS = float(os.getenv("SERPAPI_MAX_QPS", "10"))
+
+# Minimum relative change in the advertised quota rate before the limiter is retuned
+RATE_ADJUST_THRESHOLD = 0.2
+
+# Bounds on how far the advertised quota may throttle requests: the slowest rate
+# the limiter is tuned down to, the longest an exhausted quota pauses requests,
+# and the longest a caller waits for a slot (the shared client's timeout) before
+# failing with RateLimitExceeded
+RATE_LIMIT_MIN_QPS = 0.5
+RATE_LIMIT_MAX_PAUSE = 60.0
+RATE_LIMIT_MAX_WAIT = 30.0
+
+# Precompiled patterns used when cleaning snippets
+_WS_RE = re.compile(r'\s+')
+_SRC_RE = re.compile(r'\s*\[\d+\]\s*')
+
+# Extracts the page_token query parameter from an AI overview serpapi_link
+_PAGE_TOKEN_RE = re.compile(r'[?&]page_token=([^&#]+)')
+
+# Keywords that signal a query may want local or image results, matched as whole
+# words (optionally plural). The local list mirrors the one the frontend uses to
+# decide whether to show the map.
+_LOCAL_KEYWORDS = (
+    "near me", "nearby", "around", "local", "restaurant", "cafe", "shop",
+    "store", "location", "where", "address", "directions", "food", "coffee",
+    "bar", "hotel",
+)
+_IMAGE_KEYWORDS = ("photo", "picture", "image", "pic", "wallpaper", "logo", "look like")
+_LOCAL_KEYWORD_RE = re.compile(r'\b(?:' + '|'.join(_LOCAL_KEYWORDS) + r')s?\b')
+_IMAGE_KEYWORD_RE = re.compile(r'\b(?:' + '|'.join(_IMAGE_KEYWORDS) + r')s?\b')
+
+# Queries that are clearly about code rarely benefit from local or image
+# results, so those calls are skipped for them. A query only counts as code when
+# it pairs a language with a term that only makes sense for programming, or
+# contains two or more operator tokens. Bare words like "code", "script" or
+# "python" may belong to an entity with a knowledge graph gallery.
+_CODE_TERM_RE = re.compile(
+    r'\b(?:syntax|compiler?|compiling|debug(?:ging)?|refactor(?:ing)?|regexp?|'
+    r'snippet|algorithm|implement(?:ation)?|traceback|stack ?trace|segfault|'
+    r'source code|sample code|code example|unit tests?|for loop|while loop|'
+    r'list comprehension|recursion|linked list|quicksort|binary search)\b'
+)
+_CODE_LANGUAGE_RE = re.compile(
+    r'(?<!\w)(?:python|javascript|typescript|java|c\+\+|c#|rust|golang|sql|bash|'
+    r'html|css|php|ruby|kotlin|swift)(?!\w)'
+)
+_CODE_OPERATOR_RE = re.compile(r'==|!=|<=|>=|=>|->|::|\+=|\w\(\)')
+
+class RateLimitExceeded(Exception):
+    """
+    Raised when a request would have to wait longer than RATE_LIMIT_MAX_WAIT
+    for the rate limiter to let it through.
+    """
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit exceeded; retry in {retry_after:.1f} sec")
+        self.retry_after = retry_after
+
+class _RateLimiter:
+    """
+    Token bucket for outbound requests whose rate can be changed in place, so
+    retuning it never hands waiting callers a fresh, full bucket.
+    """
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    @property
+    def _capacity(self) -> float:
+        # Allow bursts of up to one second's worth of requests (at least one)
+        return max(self.rate, 1.0)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, max_wait: float = RATE_LIMIT_MAX_WAIT) -> None:
+        """
+        Wait until a request may be sent.
+        Each caller reserves a token up front (the bucket may go negative), so
+        concurrent callers are spaced out without holding a lock while sleeping.
+        Raises RateLimitExceeded instead of waiting longer than max_wait.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        self._tokens -= 1
+        wait = max(self._paused_until - now, 0.0) + max(-self._tokens, 0.0) / self.rate
+        if wait > max_wait:
+            # Give the reservation back so later callers aren't delayed by it
+            self._tokens += 1
+            raise RateLimitExceeded(wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def set_rate(self, rate: float) -> None:
+        """
+        Change the refill rate, keeping the tokens accrued so far.
+        """
+        self._refill(time.monotonic())
+        self.rate = rate
+        self._tokens = min(self._tokens, self._capacity)
+
+    def pause_for(self, seconds: float) -> None:
+        """
+        Hold all requests for the given number of seconds, up to RATE_LIMIT_MAX_PAUSE.
+        """
+        seconds = min(seconds, RATE_LIMIT_MAX_PAUSE)
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+def _should_retry(e: BaseException) -> bool:
+    """
+    Retry policy for SerpAPI requests: retry HTTP and timeout errors, but give
+    up immediately on authentication failures (401/403).
+    """
+    if isinstance(e, httpx.HTTPStatusError) and e.response.status_code in (401, 403):
+        return False
+    return isinstance(e, (httpx.HTTPError, httpx.TimeoutException))
+
 class SerpService:
     """
     A service class for interacting with the SerpAPI to perform search queries,
     retrieve local results, and generate AI-based responses.
     """
-    def __init__(self):
+    def __init__(self, client: httpx.AsyncClient):
+        # Shared HTTP client (owned by the app lifespan) so connections are pooled
+        self._client = client
+
         # Retrieve API key from environment variables
         self.api_key = os.getenv("SERPAPI_KEY")
         if not self.api_key:
             raise ValueError("SERPAPI_KEY environment variable is not set")
         
-        # Base URL and timeout settings for API requests
+        # Base URL for API requests (timeouts are configured on the shared client)
         self.base_url = "https://serpapi.com/search.json"
-        self.timeout = 30.0
+
+        # Static parameters for each search endpoint, built once; only the query varies per call
+        self._base_params = {
+            "api_key": self.api_key,
+            "google_domain": "google.com",
+            "gl": "us",
+            "hl": "en",
+        }
+        self._search_tmpl = {**self._base_params, "engine": "google", "num": 10}
+        self._local_tmpl = {**self._base_params, "engine": "google_local", "location": "United States"}
+        self._image_tmpl = {**self._base_params, "engine": "google_images", "num": 10}
+
+        if SERPAPI_MAX_QPS <= 0:
+            raise ValueError("SERPAPI_MAX_QPS must be greater than 0")
+
+        # Token bucket limiting outbound requests to the plan's QPS so bursts are
+        # queued locally instead of being rejected with 429s and retried
+        self._limiter = _RateLimiter(SERPAPI_MAX_QPS)
+
+        # LRU cache of processed search results and AI overview answers keyed on
+        # the normalized query
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any], str]]" = OrderedDict()
+
+        # In-flight fetches keyed on the normalized query, so concurrent identical
+        # searches share a single set of SerpAPI calls
+        self._inflight: Dict[str, "asyncio.Task[Tuple[Dict[str, Any], str]]"] = {}
         
         logger.info("SerpService initialized with API key")
 
-    @backoff.on_exception(
-        backoff.expo,
-        (httpx.HTTPError, httpx.TimeoutException),
-        max_tries=3,
-        # Give up retrying for HTTP status errors 401 or 403
-        giveup=lambda e: isinstance(e, httpx.HTTPStatusError) and e.response.status_code in [401, 403]
+    @retry(
+        stop=stop_after_attempt(3),
+        # Jittered exponential backoff so concurrent retries don't all fire at once
+        wait=wait_random_exponential(multiplier=0.3, max=8),
+        retry=retry_if_exception(_should_retry),
+        reraise=True
     )
     async def _make_api_request(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """
         Internal method to make an API request using given parameters with retry logic.
-        Uses an asynchronous HTTP client and raises an exception for any HTTP errors.
+        Uses the shared asynchronous HTTP client and raises an exception for any HTTP errors.
         """
-        logger.info(f"Making API request with params: {params}")
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.get(self.base_url, params=params)
-            response.raise_for_status()
-            return response.json()
+        logger.info("Making API request with params: %s", params)
+        await self._limiter.acquire()
+        response = await self._client.get(self.base_url, params=params)
+        logger.debug("SerpAPI responded over %s", response.http_version)
+        self._adjust_rate_limit(response.headers)
+        response.raise_for_status()
+        return orjson.loads(response.content)
+
+    def _adjust_rate_limit(self, headers: httpx.Headers) -> None:
+        """
+        Adapt the limiter to the remaining quota advertised by the API, if any.
+        Spreads the remaining requests over the time left until the window
+        resets, within RATE_LIMIT_MIN_QPS and SERPAPI_MAX_QPS. An exhausted
+        quota holds all requests until the reset, for at most RATE_LIMIT_MAX_PAUSE.
+        """
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        try:
+            remaining_count = float(remaining)
+            reset_in = float(reset)
+        except ValueError:
+            return
+        # The reset header may be an epoch timestamp in ms or s, or a number of seconds
+        if reset_in > 1e12:
+            reset_in = reset_in / 1000 - time.time()
+        elif reset_in > 1e9:
+            reset_in -= time.time()
+        reset_in = max(reset_in, 0.0)
+        if remaining_count <= 0:
+            logger.info("SerpAPI quota exhausted; pausing requests for %.1f sec", reset_in)
+            self._limiter.pause_for(reset_in)
+            return
+        rate = min(SERPAPI_MAX_QPS, max(RATE_LIMIT_MIN_QPS, remaining_count / max(reset_in, 1.0)))
+        # Ignore small fluctuations in a rolling quota
+        if abs(rate - self._limiter.rate) > RATE_ADJUST_THRESHOLD * self._limiter.rate:
+            logger.info("Adjusting SerpAPI rate limit to %.2f requests/sec", rate)
+            self._limiter.set_rate(rate)
 
     async def _get_ai_overview_by_token(self, page_token: str) -> str:
         """
@@ -72,24 +262,24 @@ class SerpService:
                 return ai_answer
             return ""
         except Exception as e:
-            logger.error(f"Error fetching AI overview by token: {e}")
+            logger.error("Error fetching AI overview by token: %s", e)
             return ""
 
     async def generate_ai_response(
         self, 
         query: str, 
         organic_results: List[Dict[str, Any]], 
-        knowledge_graph: Optional[Dict[str, Any]] = None,
-        ai_overview_token: Optional[str] = None
+        knowledge_graph: Optional[Dict[str, Any]] = None
     ) -> str:
         """
         Generate a concise AI response based on search results.
+        The AI overview is fetched separately by _fetch_results and takes
+        precedence when available; this covers the remaining cases.
         
         Priority:
         1. Use the knowledge graph if available.
-        2. Use the AI overview via the provided token.
-        3. Fall back to organic search results.
-        4. If no information is available, prompt the user to rephrase.
+        2. Fall back to organic search results.
+        3. If no information is available, prompt the user to rephrase.
         """
         # Use the knowledge graph if it contains a title and description
         if knowledge_graph and knowledge_graph.get("title") and knowledge_graph.get("description"):
@@ -98,50 +288,122 @@ class SerpService:
                 f"[[1]](https://www.google.com/search?q={query.replace(' ', '+')})\n\n"
             )
 
-        # Use AI overview if token is provided
-        if ai_overview_token:
-            ai_answer = await self._get_ai_overview_by_token(ai_overview_token)
-            if ai_answer:
-                return ai_answer
-
         # use organic search results
         if organic_results:
-            response = f"Here's what I found about **{query}**:\n\n"
+            parts = [f"Here's what I found about **{query}**:\n\n"]
             for i, result in enumerate(organic_results[:3], 1):
                 snippet = result.get("snippet", "")
                 if snippet:
                     clean_snippet = self._clean_snippet(snippet)
-                    response += f"* {clean_snippet} [[{i}]]({result.get('link')})\n\n"
-            return response
+                    parts.append(f"* {clean_snippet} [[{i}]]({result.get('link')})\n\n")
+            return "".join(parts)
 
         # Default message if no results were found
         return f"I couldn't find any relevant information for **{query}**. Please try rephrasing your query."
 
-    def _clean_snippet(self, snippet: str) -> str:
+    @staticmethod
+    def _clean_snippet(snippet: str) -> str:
         """
         Clean up a snippet for better readability in the AI response.
         - Removes extra whitespace.
         - Splits the snippet on source markers (e.g., [1], [2]) and formats them as bullet points.
         """
-        clean = re.sub(r'\s+', ' ', snippet).strip()
-        # Split snippet based on source markers and remove any empty strings
-        sources = [s for s in re.split(r'\s*\[\d+\]\s*', clean) if s]
-        bullet_list = []
-        for source in sources:
-            source = source.strip()
-            # Append a period if the snippet does not end with punctuation
-            if source and not source.endswith(('.', '!', '?')):
-                source += '.'
-            bullet_list.append(f"• {source}")
-        return "\n".join(bullet_list)
+        clean = _WS_RE.sub(' ', snippet).strip()
+        # Fast path: most snippets have no source markers and become a single bullet
+        if '[' not in clean:
+            if not clean:
+                return ""
+            return f"• {clean}" + ('' if clean.endswith(('.', '!', '?')) else '.')
+        # Split snippet on source markers in one regex pass and format each
+        # non-empty segment as a bullet, appending a period if it lacks punctuation.
+        # The split consumes whitespace around markers, so segments need no stripping.
+        return "\n".join(
+            f"• {source}" + ('' if source.endswith(('.', '!', '?')) else '.')
+            for source in _SRC_RE.split(clean) if source
+        )
+
+    def _get_cached(self, key: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """
+        Return the cached results and AI overview answer for a normalized query,
+        or None if the entry is missing or older than CACHE_TTL.
+        """
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        stored_at, results, ai_answer = entry
+        if time.monotonic() - stored_at > CACHE_TTL:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return results, ai_answer
+
+    def _set_cached(self, key: str, results: Dict[str, Any], ai_answer: str) -> None:
+        """
+        Store results and the AI overview answer for a normalized query, evicting
+        the least recently used entry once CACHE_MAXSIZE is exceeded.
+        """
+        self._cache[key] = (time.monotonic(), results, ai_answer)
+        self._cache.move_to_end(key)
+        if len(self._cache) > CACHE_MAXSIZE:
+            self._cache.popitem(last=False)
 
-    async def search(self, query: str) -> Dict[str, Any]:
+    @staticmethod
+    def _is_code_query(lowered: str) -> bool:
+        """
+        Return True only for queries that are clearly about code: a language
+        together with a programming-only term, or two or more operator tokens.
+        """
+        if len(_CODE_OPERATOR_RE.findall(lowered)) >= 2:
+            return True
+        return bool(_CODE_TERM_RE.search(lowered) and _CODE_LANGUAGE_RE.search(lowered))
+
+    @classmethod
+    def _needs_local(cls, query: str) -> bool:
+        """
+        Decide whether a query warrants a google_local request.
+        Defaults to True unless the query is clearly about code.
+        """
+        lowered = query.lower()
+        if _LOCAL_KEYWORD_RE.search(lowered):
+            return True
+        return not cls._is_code_query(lowered)
+
+    @classmethod
+    def _needs_images(cls, query: str) -> bool:
+        """
+        Decide whether a query warrants a google_images request.
+        Defaults to True unless the query is clearly about code.
+        """
+        lowered = query.lower()
+        if _IMAGE_KEYWORD_RE.search(lowered):
+            return True
+        return not cls._is_code_query(lowered)
+
+    @staticmethod
+    def _parse_local(result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Reduce a local result to the fields used by the map, coercing numeric values.
+        """
+        gps = result.get("gps_coordinates") or {}
+        return {
+            "title": result.get("title", ""),
+            "address": result.get("address", ""),
+            "rating": float(result.get("rating", 0)),
+            "reviews": int(result.get("reviews", 0)),
+            "gps_coordinates": {
+                "latitude": float(gps.get("latitude", 0)),
+                "longitude": float(gps.get("longitude", 0))
+            }
+        }
+
+    async def search(self, query: str, use_cache: bool = True) -> Dict[str, Any]:
         """
         Main method to perform a search query using SerpAPI.
         - Validates the query.
-        - Constructs parameters for different search engines (general, local, images).
-        - Uses asynchronous requests to fetch data in parallel.
-        - Processes and formats the results.
+        - Serves repeat queries from an in-process TTL cache unless use_cache is False.
+        - Coalesces concurrent identical queries into one in-flight fetch.
+        - Builds the AI response per caller, since all but the AI overview answer
+          quote the caller's own query text.
         """
         if not query.strip():
             logger.warning("Empty query provided")
@@ -153,50 +415,97 @@ class SerpService:
                 "ai_response": "Please provide a search query."
             }
         
-        logger.info(f"Processing search for query: {query}")
+        # Normalize the query so e.g. "Python" and "python " share a cache entry
+        cache_key = query.strip().lower()
+        if use_cache:
+            cached = self._get_cached(cache_key)
+            if cached is not None:
+                logger.info("Serving cached results for query: %s", query)
+                return await self._with_ai_response(query, *cached)
+
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_results(query, cache_key))
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        else:
+            logger.info("Joining in-flight search for query: %s", query)
+
+        # Shield the shared fetch so one caller disconnecting doesn't cancel it for the rest
+        results, ai_answer = await asyncio.shield(task)
+        return await self._with_ai_response(query, results, ai_answer)
+
+    async def _with_ai_response(
+        self,
+        query: str,
+        results: Dict[str, Any],
+        ai_answer: str
+    ) -> Dict[str, Any]:
+        """
+        Return a copy of the shared results with the AI response for this query:
+        the AI overview answer if there is one, otherwise one generated from the
+        knowledge graph or organic results.
+        """
+        ai_response = ai_answer or await self.generate_ai_response(
+            query,
+            results["organic_results"],
+            results["knowledge_graph"]
+        )
+        return {**results, "ai_response": ai_response}
+
+    async def _fetch_results(self, query: str, cache_key: str) -> Tuple[Dict[str, Any], str]:
+        """
+        Fetch and process results for a query from SerpAPI, then cache them.
+        Returns the processed results and the AI overview answer ("" if none).
+        - Constructs parameters for different search engines (general, local, images).
+        - Uses asynchronous requests to fetch data in parallel.
+        - Processes and formats the results.
+        """
+        logger.info("Processing search for query: %s", query)
         
-        # Define parameters for different search endpoints
-        params = {
-            "q": query,
-            "api_key": self.api_key,
-            "engine": "google",
-            "google_domain": "google.com",
-            "gl": "us",
-            "hl": "en",
-            "num": 10,
-        }
-        local_params = {
-            "q": query,
-            "api_key": self.api_key,
-            "engine": "google_local",
-            "google_domain": "google.com",
-            "gl": "us",
-            "hl": "en",
-            "location": "United States",
-        }
-        image_params = {
-            "q": query,
-            "api_key": self.api_key,
-            "engine": "google_images",
-            "google_domain": "google.com",
-            "gl": "us",
-            "hl": "en",
-            "num": 10,
-        }
+        # Overlay the query on the prebuilt parameters for each search endpoint
+        params = {**self._search_tmpl, "q": query}
+        local_params = {**self._local_tmpl, "q": query}
+        image_params = {**self._image_tmpl, "q": query}
 
+        ai_task: Optional["asyncio.Task[str]"] = None
         try:
-            # Make parallel API requests for general search, local results, and images
-            search_data, local_data, images_data = await asyncio.gather(
-                self._make_api_request(params),
-                self._make_api_request(local_params),
-                self._make_api_request(image_params)
-            )
-            logger.info(f"Successfully fetched search results for query: {query}")
+            # Make parallel API requests for general search and, when the query
+            # calls for them, local results and images
+            needs_local = self._needs_local(query)
+            needs_images = self._needs_images(query)
+            tasks = [self._make_api_request(params)]
+            if needs_local:
+                tasks.append(self._make_api_request(local_params))
+            if needs_images:
+                tasks.append(self._make_api_request(image_params))
+            responses = await asyncio.gather(*tasks)
+
+            search_data = responses[0]
+            local_data = responses[1] if needs_local else {}
+            images_data = responses[-1] if needs_images else {}
+            logger.info("Successfully fetched search results for query: %s", query)
 
             # Attach image results to the knowledge graph if available
             if "knowledge_graph" in search_data:
                 search_data["knowledge_graph"]["images"] = images_data.get("images_results", [])[:10]
 
+            # Attempt to extract the AI overview token from the search response
+            ai_overview = search_data.get("ai_overview", {})
+            ai_overview_token = ai_overview.get("page_token")
+            if not ai_overview_token and "serpapi_link" in ai_overview:
+                match = _PAGE_TOKEN_RE.search(ai_overview["serpapi_link"])
+                if match:
+                    # Decode the value the same way parse_qs would
+                    ai_overview_token = unquote_plus(match.group(1))
+                    logger.info("Extracted AI overview token from serpapi_link.")
+
+            # The knowledge graph takes priority in the AI response; without it, start
+            # fetching the AI overview now so it overlaps with result processing
+            knowledge_graph = search_data.get("knowledge_graph") or {}
+            if ai_overview_token and not (knowledge_graph.get("title") and knowledge_graph.get("description")):
+                ai_task = asyncio.create_task(self._get_ai_overview_by_token(ai_overview_token))
+
             # Process and format search results
             processed_results = {
                 "organic_results": [
@@ -208,53 +517,38 @@ class SerpService:
                     for result in search_data.get("organic_results", [])
                 ],
                 "knowledge_graph": {
-                    "title": search_data.get("knowledge_graph", {}).get("title"),
-                    "description": search_data.get("knowledge_graph", {}).get("description"),
-                    "image": search_data.get("knowledge_graph", {}).get("image"),
-                    "images": search_data.get("knowledge_graph", {}).get("images", [])
+                    "title": knowledge_graph.get("title"),
+                    "description": knowledge_graph.get("description"),
+                    "image": knowledge_graph.get("image"),
+                    "images": knowledge_graph.get("images", [])
                 } if "knowledge_graph" in search_data else None,
                 "related_questions": search_data.get("related_questions", []),
                 "related_searches": search_data.get("related_searches", []),
                 "local_results": [
-                    {
-                        "title": result.get("title", ""),
-                        "address": result.get("address", ""),
-                        "rating": float(result.get("rating", 0)),
-                        "reviews": int(result.get("reviews", 0)),
-                        "gps_coordinates": {
-                            "latitude": float(result.get("gps_coordinates", {}).get("latitude", 0)),
-                            "longitude": float(result.get("gps_coordinates", {}).get("longitude", 0))
-                        }
-                    }
+                    self._parse_local(result)
                     for result in local_data.get("local_results", [])[:3]
                     if isinstance(result, dict)
                 ]
             }
 
-            # Attempt to extract the AI overview token from the search response
-            ai_overview = search_data.get("ai_overview", {})
-            ai_overview_token = ai_overview.get("page_token")
-            if not ai_overview_token and "serpapi_link" in ai_overview:
-                parsed_url = urlparse(ai_overview["serpapi_link"])
-                token_list = parse_qs(parsed_url.query).get("page_token")
-                if token_list:
-                    ai_overview_token = token_list[0]
-                    logger.info("Extracted AI overview token from serpapi_link.")
-
-            # Generate the AI response based on available information
-            processed_results["ai_response"] = await self.generate_ai_response(
-                query, 
-                processed_results["organic_results"],
-                processed_results["knowledge_graph"],
-                ai_overview_token=ai_overview_token
-            )
-            return processed_results
+            ai_answer = await ai_task if ai_task else ""
+            # An empty answer from a started AI overview fetch usually means it
+            # failed; don't pin the fallback response for the whole TTL
+            if ai_task and not ai_answer:
+                logger.info("Not caching results without the AI overview for query: %s", query)
+            else:
+                self._set_cached(cache_key, processed_results, ai_answer)
+            return processed_results, ai_answer
 
         except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error during search: {e}")
+            logger.error("HTTP error during search: %s", e)
             if hasattr(e, 'response') and e.response:
-                logger.error(f"Response details: {e.response.text}")
+                logger.error("Response details: %s", e.response.text)
             raise
         except Exception as e:
-            logger.error(f"Error during search: {e}")
-            raise
\ No newline at end of file
+            logger.error("Error during search: %s", e)
+            raise
+        finally:
+            # Don't leave the AI overview fetch running if processing failed
+            if ai_task and not ai_task.done():
+                ai_task.cancel()
\ No newline at end of file